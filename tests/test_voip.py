@@ -1,15 +1,16 @@
 import pytest
-from voip_web import create_app, socketio
+from voip_web import create_app
+from voip_web.server import create_socketio, register_socketio_handlers
 from voip_web.config import Config
 from voip_web.utils import get_local_ip, generate_qr_base64, validate_username, sanitize_message
-from voip_web.storage import MemoryStorage
+from voip_web.storage import MemoryStorage, RedisStorage, User
 
 
 # === Fixtures ===
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def app():
-    """Crée une instance de l'app pour les tests"""
+    """Crée une instance de l'app, partagée par toute la session de tests"""
     config = {
         'TESTING': True,
         'SECRET_KEY': 'test_key' 
@@ -24,10 +25,27 @@ def client(app):
     return app.test_client()
 
 
+@pytest.fixture(scope="session")
+def _socketio_server(app):
+    """Serveur SocketIO avec ses handlers, créé une seule fois par session"""
+    socketio = create_socketio(app)
+    register_socketio_handlers(socketio)
+    return socketio
+
+
 @pytest.fixture
-def socketio_client(app):
-    """Client SocketIO de test"""
-    return socketio.test_client(app)
+def socketio_client(app, _socketio_server):
+    """Client SocketIO de test (nouveau client par test, serveur partagé)"""
+    client = _socketio_server.test_client(app)
+    yield client
+    if client.is_connected():
+        client.disconnect()
+
+
+@pytest.fixture(autouse=True)
+def _clean_storage():
+    """Stockage mémoire vidé avant chaque test (dicts partagés au niveau du module)"""
+    MemoryStorage().clear()
 
 
 @pytest.fixture
@@ -36,6 +54,16 @@ def storage():
     return MemoryStorage()
 
 
+@pytest.fixture
+def redis_storage(monkeypatch):
+    """RedisStorage branché sur un serveur fakeredis vierge"""
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, 'Redis', lambda **kwargs: fakeredis.FakeRedis(server=server, **kwargs))
+    return RedisStorage()
+
+
 # === Tests Configuration ===
 
 def test_config_default():
@@ -59,6 +87,43 @@ def test_config_get_set():
     assert cfg.get('custom', 'key') == 'value'
 
 
+def test_config_instances_independent():
+    """Test que les instances ne partagent pas les valeurs par défaut"""
+    cfg = Config()
+    cfg.set('server', 'port', value=8080)
+    cfg.get('webrtc', 'ice_servers').append({'urls': 'stun:example.com'})
+    
+    other = Config()
+    assert other.get('server', 'port') == 5000
+    assert len(other.get('webrtc', 'ice_servers')) == 2
+    assert Config.DEFAULT_CONFIG['server']['port'] == 5000
+
+
+def test_config_set_subtree():
+    """Test du remplacement d'une section complète de config"""
+    cfg = Config()
+    
+    cfg.set('server', value={'port': 9000})
+    assert cfg.get('server', 'port') == 9000
+    assert cfg.get('server', 'host') is None  # Ancienne valeur retirée
+    assert cfg.get('server') == {'port': 9000}
+
+
+def test_config_sections_are_copies():
+    """Test qu'une section lue ne permet pas de contourner set()"""
+    cfg = Config()
+    
+    cfg.get('limits')['max_message_length'] = 10
+    cfg.to_dict()['limits']['max_message_length'] = 10
+    assert cfg.get('limits', 'max_message_length') == 1000
+    assert cfg.get('limits')['max_message_length'] == 1000
+    
+    section = {'port': 9000}
+    cfg.set('server', value=section)
+    section['port'] = 9001
+    assert cfg.get('server', 'port') == 9000
+
+
 def test_config_merge():
     """Test de la fusion de configs"""
     cfg = Config()
@@ -88,6 +153,10 @@ def test_get_local_ip():
     assert ip is not None
     assert isinstance(ip, str)
     assert len(ip.split('.')) == 4  # Format IPv4
+    
+    # Résultat mis en cache, rafraîchissable à la demande
+    assert get_local_ip() == ip
+    assert get_local_ip(refresh=True) == ip
 
 
 def test_generate_qr_base64():
@@ -100,18 +169,30 @@ def test_generate_qr_base64():
     assert len(qr_base64) > 100  # Le base64 doit être assez long
 
 
-def test_validate_username():
-    """Test de validation des noms d'utilisateur"""
-    # Valides
-    assert validate_username("Alice")[0] is True
-    assert validate_username("Bob123")[0] is True
-    assert validate_username("User_Name")[0] is True
+def test_generate_qr_base64_svg():
+    """Test de génération de QR code SVG (sans PIL)"""
+    import base64
     
-    # Invalides
-    assert validate_username("")[0] is False
-    assert validate_username("A")[0] is False  # Trop court
-    assert validate_username("A" * 50)[0] is False  # Trop long
-    assert validate_username("   ")[0] is False  # Vide
+    qr_base64 = generate_qr_base64("https://example.com", image_format='svg')
+    
+    assert b'<svg' in base64.b64decode(qr_base64)
+
+
+@pytest.mark.parametrize("username", ["Alice", "Bob123", "User_Name"])
+def test_validate_username(username):
+    """Test de validation des noms d'utilisateur valides"""
+    assert validate_username(username)[0] is True
+
+
+@pytest.mark.parametrize("username", [
+    "",
+    "A",  # Trop court
+    "A" * 50,  # Trop long
+    "   ",  # Vide
+])
+def test_validate_username_invalid(username):
+    """Test de validation des noms d'utilisateur invalides"""
+    assert validate_username(username)[0] is False
 
 
 def test_sanitize_message():
@@ -131,11 +212,11 @@ def test_sanitize_message():
 
 def test_memory_storage_users(storage):
     """Test du stockage des utilisateurs"""
-    storage.set_user('sid1', {'name': 'Alice', 'room': 'lobby'})
-    storage.set_user('sid2', {'name': 'Bob', 'room': 'lobby'})
+    storage.set_user('sid1', User('Alice', 'lobby'))
+    storage.set_user('sid2', User('Bob', 'lobby'))
     
-    assert storage.get_user('sid1')['name'] == 'Alice'
-    assert storage.get_user('sid2')['name'] == 'Bob'
+    assert storage.get_user('sid1').name == 'Alice'
+    assert storage.get_user('sid2').name == 'Bob'
     
     users = storage.get_users()
     assert len(users) == 2
@@ -145,6 +226,75 @@ def test_memory_storage_users(storage):
     assert len(storage.get_users()) == 1
 
 
+def test_memory_storage_find_user_sid(storage):
+    """Test de la recherche d'un utilisateur par nom dans une room"""
+    storage.set_user('sid1', User('Alice', 'lobby'))
+    
+    assert storage.find_user_sid('lobby', 'Alice') == 'sid1'
+    assert storage.find_user_sid('room2', 'Alice') is None
+    
+    # Changement de room
+    storage.set_user('sid1', User('Alice', 'room2'))
+    assert storage.find_user_sid('lobby', 'Alice') is None
+    assert storage.find_user_sid('room2', 'Alice') == 'sid1'
+    
+    storage.delete_user('sid1')
+    assert storage.find_user_sid('room2', 'Alice') is None
+
+
+def test_memory_storage_find_user_sid_shared_name(storage):
+    """Test d'un nom partagé par deux utilisateurs d'une room"""
+    storage.set_user('sid1', User('Alice', 'lobby'))
+    storage.set_user('sid2', User('Alice', 'lobby'))
+    
+    # Le dernier arrivé l'emporte
+    assert storage.find_user_sid('lobby', 'Alice') == 'sid2'
+    
+    # Après son départ, l'index pointe à nouveau vers le premier
+    storage.delete_user('sid2')
+    assert storage.find_user_sid('lobby', 'Alice') == 'sid1'
+
+
+def test_memory_storage_room_usernames(storage):
+    """Test de la liste des noms d'une room"""
+    storage.set_user('sid1', User('Alice', 'lobby'))
+    storage.set_user('sid2', User('Bob', 'lobby'))
+    storage.add_user_to_room('lobby', 'sid1')
+    storage.add_user_to_room('lobby', 'sid2')
+    
+    assert storage.get_room_usernames('lobby') == ['Alice', 'Bob']
+    
+    storage.remove_user_from_room('lobby', 'sid1')
+    assert storage.get_room_usernames('lobby') == ['Bob']
+    
+    storage.delete_room('lobby')
+    assert storage.get_room_usernames('lobby') == []
+    
+    storage.delete_user('sid1')
+    storage.delete_user('sid2')
+
+
+def test_memory_storage_leave_room(storage):
+    """Test du départ d'une room (suppression quand elle devient vide)"""
+    storage.set_user('sid1', User('Alice', 'room3'))
+    storage.set_user('sid2', User('Bob', 'room3'))
+    storage.add_user_to_room('room3', 'sid1')
+    storage.add_user_to_room('room3', 'sid2')
+    
+    assert storage.leave_room('room3', 'sid1') is False
+    assert storage.get_room_usernames('room3') == ['Bob']
+    
+    assert storage.leave_room('room3', 'sid2') is True
+    assert 'room3' not in storage.get_rooms()
+    assert storage.get_room_usernames('room3') == []
+    
+    # Room inexistante : considérée comme vide
+    assert storage.leave_room('room3', 'sid1') is True
+    
+    storage.delete_user('sid1')
+    storage.delete_user('sid2')
+
+
 def test_memory_storage_rooms(storage):
     """Test du stockage des rooms"""
     storage.add_user_to_room('lobby', 'sid1')
@@ -167,6 +317,65 @@ def test_memory_storage_rooms(storage):
     assert len(storage.get_room('lobby')) == 0
 
 
+def test_redis_storage_users(redis_storage):
+    """Test du stockage Redis des utilisateurs"""
+    redis_storage.set_user('sid1', User('Alice', 'lobby'))
+    redis_storage.set_user('sid2', User('Bob', 'lobby'))
+    
+    assert redis_storage.get_user('sid1') == User('Alice', 'lobby')
+    assert set(redis_storage.get_users()) == {'sid1', 'sid2'}
+    
+    # Changement de room
+    redis_storage.set_user('sid1', User('Alice', 'room2'))
+    assert redis_storage.get_user('sid1') == User('Alice', 'room2')
+    
+    redis_storage.delete_user('sid1')
+    assert redis_storage.get_user('sid1') is None
+    assert set(redis_storage.get_users()) == {'sid2'}
+
+
+def test_redis_storage_rooms(redis_storage):
+    """Test des rooms Redis et de la recherche par nom"""
+    redis_storage.set_user('sid1', User('Alice', 'lobby'))
+    redis_storage.set_user('sid2', User('Bob', 'lobby'))
+    redis_storage.add_user_to_room('lobby', 'sid1', 'Alice')
+    # Sans nom : relu depuis le hash de l'utilisateur
+    redis_storage.add_user_to_room('lobby', 'sid2')
+    
+    assert set(redis_storage.get_room('lobby')) == {'sid1', 'sid2'}
+    assert sorted(redis_storage.get_room_usernames('lobby')) == ['Alice', 'Bob']
+    assert redis_storage.find_user_sid('lobby', 'Alice') == 'sid1'
+    assert redis_storage.find_user_sid('lobby', 'Bob') == 'sid2'
+    assert redis_storage.find_user_sid('room2', 'Alice') is None
+    
+    redis_storage.remove_user_from_room('lobby', 'sid1')
+    assert redis_storage.get_room('lobby') == ['sid2']
+    assert redis_storage.find_user_sid('lobby', 'Alice') is None
+    
+    redis_storage.delete_room('lobby')
+    assert redis_storage.get_room('lobby') == []
+    assert redis_storage.get_rooms() == {}
+
+
+def test_redis_storage_leave_room(redis_storage):
+    """Test du départ d'une room Redis (suppression quand elle devient vide)"""
+    redis_storage.set_user('sid1', User('Alice', 'room3'))
+    redis_storage.set_user('sid2', User('Bob', 'room3'))
+    redis_storage.add_user_to_room('room3', 'sid1', 'Alice')
+    redis_storage.add_user_to_room('room3', 'sid2', 'Bob')
+    
+    assert redis_storage.leave_room('room3', 'sid1') is False
+    assert redis_storage.get_room_usernames('room3') == ['Bob']
+    
+    assert redis_storage.leave_room('room3', 'sid2') is True
+    assert 'room3' not in redis_storage.get_rooms()
+    assert redis_storage.get_room_usernames('room3') == []
+    
+    # Le dernier départ supprime les clés de la room et son entrée d'index
+    assert not redis_storage.redis.exists('voip:room:room3', 'voip:room_names:room3')
+    assert not redis_storage.redis.sismember('voip:rooms', 'room3')
+
+
 # === Tests Routes Flask ===
 
 def test_index_route(client):
@@ -261,6 +470,36 @@ def test_socketio_disconnect(socketio_client):
     assert not socketio_client.is_connected()
 
 
+def test_socketio_webrtc_signal_batch():
+    """Test du regroupement des signaux WebRTC (fenêtre de batch activée)"""
+    cfg = Config()
+    cfg.set('webrtc', 'signal_batch_window', value=0.05)
+    batch_app = create_app({'TESTING': True})
+    batch_server = create_socketio(batch_app)
+    register_socketio_handlers(batch_server, cfg)
+    
+    alice = batch_server.test_client(batch_app)
+    bob = batch_server.test_client(batch_app)
+    alice.emit('join', {'username': 'Alice', 'room': 'lobby'})
+    bob.emit('join', {'username': 'Bob', 'room': 'lobby'})
+    bob.get_received()
+    
+    for i in range(3):
+        alice.emit('webrtc_signal', {'target': 'Bob', 'signal': {'candidate': i}})
+    batch_server.sleep(0.2)
+    
+    received = bob.get_received()
+    batches = [msg for msg in received if msg['name'] == 'webrtc_signal_batch']
+    assert len(batches) == 1
+    signals = batches[0]['args'][0]['signals']
+    assert [s['signal'] for s in signals] == [{'candidate': 0}, {'candidate': 1}, {'candidate': 2}]
+    assert all(s['sender'] == 'Alice' for s in signals)
+    assert not any(msg['name'] == 'webrtc_signal' for msg in received)
+    
+    alice.disconnect()
+    bob.disconnect()
+
+
 # === Tests d'intégration ===
 
 def test_full_chat_flow(socketio_client):
@@ -314,18 +553,16 @@ def test_username_length_limits():
     assert validate_username(long_name)[0] is False
 
 
-def test_message_sanitization():
+@pytest.mark.parametrize("dangerous", [
+    "<script>alert('xss')</script>",
+    "<img src=x onerror=alert('xss')>",
+    "<iframe src='javascript:alert(1)'>",
+])
+def test_message_sanitization(dangerous):
     """Test de la sanitisation des messages"""
-    dangerous_inputs = [
-        "<script>alert('xss')</script>",
-        "<img src=x onerror=alert('xss')>",
-        "<iframe src='javascript:alert(1)'>",
-    ]
-    
-    for dangerous in dangerous_inputs:
-        sanitized = sanitize_message(dangerous)
-        assert '<' not in sanitized
-        assert '>' not in sanitized
+    sanitized = sanitize_message(dangerous)
+    assert '<' not in sanitized
+    assert '>' not in sanitized
 
 
 # === Exécution des tests ===
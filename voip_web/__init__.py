@@ -14,10 +14,18 @@ def get_socketio():
     from .server import socketio
     return socketio
 
-def get_local_ip():
+def get_local_ip(refresh=False):
     from .utils import get_local_ip as _get_local_ip
-    return _get_local_ip()
+    return _get_local_ip(refresh)
 
 def generate_qr_base64(url):
     from .utils import generate_qr_base64 as _generate_qr_base64
-    return _generate_qr_base64(url)
\ No newline at end of file
+    return _generate_qr_base64(url)
+
+
+def __getattr__(name):
+    # Accès paresseux à `socketio` (PEP 562) : `server` n'est importé
+    # qu'au premier accès, pas lors de `import voip_web`
+    if name == "socketio":
+        return get_socketio()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
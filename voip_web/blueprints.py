@@ -1,6 +1,10 @@
+import logging
 from flask import Blueprint, render_template, jsonify
 from .utils import get_local_ip, generate_qr_base64
 from .config import get_config
+from .storage import get_storage
+
+logger = logging.getLogger(__name__)
 
 # Blueprint principal
 voip_bp = Blueprint(
@@ -18,24 +22,95 @@ api_bp = Blueprint(
     url_prefix='/voip/api'
 )
 
+# Réponses API précalculées et l'instance Config dont elles proviennent
+_API_PAYLOADS = {}
+_API_PAYLOADS_SOURCE = None
 
-# === Routes Blueprint Principal ===
 
-@voip_bp.route('/')
-def index():
-    """Page d'accueil avec QR code"""
+def _cached_payload(name, build):
+    """
+    Retourne une réponse API précalculée
+    
+    Chaque réponse est construite une seule fois par instance de Config :
+    un reload_config() crée une nouvelle instance, ce qui vide le cache.
+    
+    Args:
+        name (str): Nom de la réponse dans le cache
+        build (callable): Fonction construisant la réponse depuis la Config
+    """
+    global _API_PAYLOADS_SOURCE
+    
+    config = get_config()
+    if _API_PAYLOADS_SOURCE is not config:
+        _API_PAYLOADS.clear()
+        _API_PAYLOADS_SOURCE = config
+    
+    payload = _API_PAYLOADS.get(name)
+    if payload is None:
+        payload = _API_PAYLOADS[name] = build(config)
+    return payload
+
+
+def _build_status(config):
+    """Status du serveur (features et limits figées au démarrage)"""
+    return {
+        'status': 'online',
+        'version': '1.0.0',
+        'features': config.get('features'),
+        'limits': config.get('limits')
+    }
+
+
+def _build_public_config(config):
+    """Configuration publique (sans secrets)"""
+    return {
+        'features': config.get('features'),
+        'limits': {
+            'max_users_per_room': config.get('limits', 'max_users_per_room'),
+            'max_message_length': config.get('limits', 'max_message_length'),
+            'max_username_length': config.get('limits', 'max_username_length'),
+            'min_username_length': config.get('limits', 'min_username_length')
+        },
+        'webrtc': {
+            'ice_servers': config.get('webrtc', 'ice_servers'),
+            'signal_batch_window': config.get('webrtc', 'signal_batch_window')
+        }
+    }
+
+
+def _get_chat_qr_code():
+    """
+    Retourne l'IP, l'URL du chat et son QR code
+    
+    Le QR code est rendu en SVG (sans image PIL ni encodage PNG) et ne dépend que
+    de l'URL : generate_qr_base64 le met en cache.
+    
+    Returns:
+        tuple: (server_ip, server_url, qr_code) - qr_code en base64, à
+            afficher en data:image/svg+xml;base64
+    """
     config = get_config()
     server_ip = get_local_ip()
     port = config.get('server', 'port', default=5000)
     
     protocol = 'https' if config.get('ssl', 'enabled') else 'http'
     server_url = f"{protocol}://{server_ip}:{port}/voip/chat"
-    qr_code = generate_qr_base64(server_url)
+    
+    return server_ip, server_url, generate_qr_base64(server_url, image_format='svg')
+
+
+# === Routes Blueprint Principal ===
+
+@voip_bp.route('/')
+def index():
+    """Page d'accueil avec QR code"""
+    server_ip, server_url, qr_code = _get_chat_qr_code()
     
     return render_template('index.html', 
                          server_ip=server_ip,
                          server_url=server_url,
-                         qr_code=qr_code)
+                         qr_code=qr_code,
+                         qr_mime_type='image/svg+xml')
 
 
 @voip_bp.route('/chat')
@@ -55,51 +130,29 @@ def chat():
 @api_bp.route('/status')
 def status():
     """Status du serveur"""
-    config = get_config()
-    return jsonify({
-        'status': 'online',
-        'version': '1.0.0',
-        'features': config.get('features'),
-        'limits': config.get('limits')
-    })
+    return jsonify(_cached_payload('status', _build_status))
 
 
 @api_bp.route('/config')
 def get_public_config():
     """Configuration publique (sans secrets)"""
-    config = get_config()
-    
-    public_config = {
-        'features': config.get('features'),
-        'limits': {
-            'max_users_per_room': config.get('limits', 'max_users_per_room'),
-            'max_message_length': config.get('limits', 'max_message_length'),
-            'max_username_length': config.get('limits', 'max_username_length'),
-            'min_username_length': config.get('limits', 'min_username_length')
-        },
-        'webrtc': {
-            'ice_servers': config.get('webrtc', 'ice_servers')
-        }
-    }
-    
-    return jsonify(public_config)
+    return jsonify(_cached_payload('config', _build_public_config))
 
 
 @api_bp.route('/rooms')
 def list_rooms():
-    """Liste des rooms actives (nécessite import de rooms)"""
-    from .server import rooms
-    
-    room_list = []
-    for room_name, user_sids in rooms.items():
-        room_list.append({
-            'name': room_name,
-            'users': len(user_sids)
-        })
+    """Liste des rooms actives"""
+    # Copie instantanée : les handlers SocketIO peuvent modifier les rooms
+    # pendant la construction de la réponse
+    rooms_snapshot = list(get_storage().get_rooms().items())
+    room_list = [
+        {'name': room_name, 'users': len(user_sids)}
+        for room_name, user_sids in rooms_snapshot
+    ]
     
     return jsonify({
         'rooms': room_list,
-        'total': len(room_list)
+        'total': len(rooms_snapshot)
     })
 
 
@@ -107,4 +160,7 @@ def register_blueprints(app):
     """Enregistre tous les blueprints dans l'application"""
     app.register_blueprint(voip_bp)
     app.register_blueprint(api_bp)
-    print("✓ Blueprints VoIP enregistrés")
\ No newline at end of file
+    
+    # Générer le QR code au démarrage plutôt qu'à la première requête
+    _get_chat_qr_code()
+    logger.info("Blueprints VoIP enregistrés")
\ No newline at end of file
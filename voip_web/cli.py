@@ -1,10 +1,39 @@
+# Le monkey-patching doit précéder tout autre import pour que socket/ssl
+# soient remplacés par leurs versions coopératives partout
+import eventlet
+eventlet.monkey_patch()
+
 import click
+import importlib.util
+import socket
 import sys
-import os
+from functools import lru_cache
 from pathlib import Path
 
 from .config import Config, get_config, reload_config
-from .utils import get_local_ip
+from .utils import get_local_ip, setup_logging
+
+
+@lru_cache(maxsize=1)
+def _hostname():
+    """Nom d'hôte de la machine (portable, mis en cache)"""
+    return socket.gethostname()
+
+
+@lru_cache(maxsize=4)
+def _dump_config_yaml(config_file):
+    """
+    Sérialise en YAML la configuration chargée depuis un fichier
+    
+    Args:
+        config_file (str): Fichier de configuration, ou None pour la config par défaut
+        
+    Returns:
+        str: Configuration au format YAML (mise en cache par fichier)
+    """
+    import yaml
+    cfg = Config(config_file) if config_file else Config()
+    return yaml.dump(cfg.to_dict(), default_flow_style=False)
 
 
 @click.group()
@@ -44,10 +73,18 @@ def start(host, port, config, no_ssl, debug):
     if debug:
         cfg.set('server', 'debug', value=True)
     
+    # eventlet.monkey_patch() est appliqué dès l'import de ce module :
+    # un autre mode tournerait sur une bibliothèque standard patchée
+    async_mode = cfg.get('socketio', 'async_mode')
+    if async_mode not in (None, 'eventlet'):
+        click.echo(click.style(f"✗ async_mode '{async_mode}' non supporté par voip-web start (eventlet uniquement)", fg='red'))
+        click.echo("Utilisez python -m voip_web.server pour un autre mode.")
+        sys.exit(1)
+    
+    setup_logging(cfg)
+    
     # Importer ici pour éviter les imports circulaires
     from .server import create_app, create_socketio
-    import eventlet
-    import eventlet.wsgi
     
     # Créer l'app
     app = create_app(cfg.to_dict())
@@ -55,12 +92,13 @@ def start(host, port, config, no_ssl, debug):
         app,
         cors_allowed_origins=cfg.get('socketio', 'cors_allowed_origins'),
         ping_timeout=cfg.get('socketio', 'ping_timeout'),
-        ping_interval=cfg.get('socketio', 'ping_interval')
+        ping_interval=cfg.get('socketio', 'ping_interval'),
+        async_mode=async_mode
     )
     
     # Enregistrer les handlers SocketIO
     from .server import register_socketio_handlers
-    register_socketio_handlers(socketio)
+    register_socketio_handlers(socketio, cfg)
     
     # Afficher les informations
     server_host = cfg.get('server', 'host')
@@ -85,6 +123,7 @@ def start(host, port, config, no_ssl, debug):
     
     # Démarrer le serveur
     try:
+        ssl_args = {}
         if ssl_enabled:
             cert_file = cfg.get('ssl', 'cert_file')
             key_file = cfg.get('ssl', 'key_file')
@@ -94,20 +133,15 @@ def start(host, port, config, no_ssl, debug):
                 click.echo("Générez-les avec: voip-web generate-certs")
                 sys.exit(1)
             
-            context = eventlet.wrap_ssl(
-                eventlet.listen((server_host, server_port)),
-                certfile=cert_file,
-                keyfile=key_file,
-                server_side=True
-            )
-            eventlet.wsgi.server(context, app)
-        else:
-            socketio.run(
-                app,
-                host=server_host,
-                port=server_port,
-                debug=cfg.get('server', 'debug')
-            )
+            ssl_args = {'certfile': cert_file, 'keyfile': key_file}
+        
+        socketio.run(
+            app,
+            host=server_host,
+            port=server_port,
+            debug=cfg.get('server', 'debug'),
+            **ssl_args
+        )
     except KeyboardInterrupt:
         click.echo("\n✓ Serveur arrêté")
     except Exception as e:
@@ -142,7 +176,7 @@ def generate_certs():
             '-keyout', 'key.pem', '-out', 'cert.pem',
             '-days', '365', '-nodes',
             '-subj', '/CN=localhost'
-        ], capture_output=True, text=True)
+        ], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
         
         if result.returncode == 0:
             click.echo(click.style("✓ Certificats générés avec succès!", fg='green'))
@@ -164,13 +198,10 @@ def show_config(config):
     """Affiche la configuration actuelle"""
     
     if Path(config).exists():
-        cfg = Config(config)
+        click.echo(_dump_config_yaml(config))
     else:
-        cfg = Config()
         click.echo(click.style(f"{config} non trouvé, affichage de la config par défaut\n", fg='yellow'))
-    
-    import yaml
-    click.echo(yaml.dump(cfg.to_dict(), default_flow_style=False))
+        click.echo(_dump_config_yaml(None))
 
 
 @cli.command()
@@ -191,19 +222,18 @@ def test():
         'yaml': 'PyYAML'
     }
     
+    # find_spec localise le module sans l'exécuter (pas d'import en cascade)
     for module, name in packages.items():
-        try:
-            __import__(module)
+        if importlib.util.find_spec(module) is not None:
             click.echo(f"  ✓ {name}")
-        except ImportError:
+        else:
             click.echo(click.style(f"  ✗ {name} manquant", fg='red'))
             errors.append(name)
     
     # Test Redis (optionnel)
-    try:
-        import redis
+    if importlib.util.find_spec('redis') is not None:
         click.echo(f"  ✓ redis (optionnel)")
-    except ImportError:
+    else:
         click.echo(f" redis non installé (optionnel)")
     
     # Test de la configuration
@@ -243,7 +273,7 @@ def info():
     click.echo("="*50)
     click.echo(f"Version: 1.0.0")
     click.echo(f"IP locale: {server_ip}")
-    click.echo(f"Hostname: {os.uname().nodename}")
+    click.echo(f"Hostname: {_hostname()}")
     click.echo("="*50 + "\n")
 
 
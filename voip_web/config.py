@@ -1,7 +1,46 @@
 import os
+import pickle
+import threading
 import yaml
 from pathlib import Path
 
+# Utiliser LibYAML (implémentation C) si PyYAML a été compilé avec
+try:
+    from yaml import CSafeLoader as _YamlLoader, CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader, SafeDumper as _YamlDumper
+
+
+def _env_bool(value):
+    """Convertit une variable d'environnement en booléen"""
+    return value.lower() == 'true'
+
+
+# Variables d'environnement : (nom, chemin dans la config, conversion)
+_ENV_MAP = (
+    # Serveur
+    ('VOIP_HOST', ('server', 'host'), str),
+    ('VOIP_PORT', ('server', 'port'), int),
+    ('VOIP_SECRET_KEY', ('server', 'secret_key'), str),
+    ('VOIP_DEBUG', ('server', 'debug'), _env_bool),
+    # SSL
+    ('VOIP_SSL_ENABLED', ('ssl', 'enabled'), _env_bool),
+    ('VOIP_SSL_CERT', ('ssl', 'cert_file'), str),
+    ('VOIP_SSL_KEY', ('ssl', 'key_file'), str),
+    # Redis
+    ('VOIP_REDIS_ENABLED', ('redis', 'enabled'), _env_bool),
+    ('VOIP_REDIS_HOST', ('redis', 'host'), str),
+    ('VOIP_REDIS_PORT', ('redis', 'port'), int),
+    ('VOIP_REDIS_PASSWORD', ('redis', 'password'), str),
+)
+
+
+def _copy_tree(value):
+    """Copie les dictionnaires imbriqués (les autres valeurs sont partagées)"""
+    if isinstance(value, dict):
+        return {key: _copy_tree(sub_value) for key, sub_value in value.items()}
+    return value
+
 
 class Config:
     """Gestionnaire de configuration pour VoIP Web"""
@@ -56,10 +95,15 @@ class Config:
             'ice_servers': [
                 {'urls': 'stun:stun.l.google.com:19302'},
                 {'urls': 'stun:stun1.l.google.com:19302'}
-            ]
+            ],
+            'signal_batch_window': 0
         }
     }
     
+    # Copie sérialisée des valeurs par défaut : chaque instance en obtient une
+    # copie profonde (plus rapide que copy.deepcopy)
+    _DEFAULT_PICKLE = pickle.dumps(DEFAULT_CONFIG, protocol=pickle.HIGHEST_PROTOCOL)
+    
     def __init__(self, config_file=None):
         """
         Initialise la configuration
@@ -67,7 +111,11 @@ class Config:
         Args:
             config_file (str): Chemin vers le fichier de configuration YAML
         """
-        self.config = self.DEFAULT_CONFIG.copy()
+        self.config = pickle.loads(self._DEFAULT_PICKLE)
+        
+        # Index plat {('server', 'port'): 5000, ...} utilisé par get()
+        self._flat = {}
+        self._rebuild_index()
         
         if config_file:
             self.load_from_file(config_file)
@@ -81,7 +129,7 @@ class Config:
             config_path = Path(config_file)
             if config_path.exists():
                 with open(config_path, 'r') as f:
-                    file_config = yaml.safe_load(f)
+                    file_config = yaml.load(f, Loader=_YamlLoader)
                     if file_config:
                         self._merge_config(self.config, file_config)
                 print(f"✓ Configuration chargée depuis {config_file}")
@@ -92,46 +140,52 @@ class Config:
     
     def load_from_env(self):
         """Charge la configuration depuis les variables d'environnement"""
-        # Serveur
-        if os.getenv('VOIP_HOST'):
-            self.config['server']['host'] = os.getenv('VOIP_HOST')
-        if os.getenv('VOIP_PORT'):
-            self.config['server']['port'] = int(os.getenv('VOIP_PORT'))
-        if os.getenv('VOIP_SECRET_KEY'):
-            self.config['server']['secret_key'] = os.getenv('VOIP_SECRET_KEY')
-        if os.getenv('VOIP_DEBUG'):
-            self.config['server']['debug'] = os.getenv('VOIP_DEBUG').lower() == 'true'
-        
-        # SSL
-        if os.getenv('VOIP_SSL_ENABLED'):
-            self.config['ssl']['enabled'] = os.getenv('VOIP_SSL_ENABLED').lower() == 'true'
-        if os.getenv('VOIP_SSL_CERT'):
-            self.config['ssl']['cert_file'] = os.getenv('VOIP_SSL_CERT')
-        if os.getenv('VOIP_SSL_KEY'):
-            self.config['ssl']['key_file'] = os.getenv('VOIP_SSL_KEY')
-        
-        # Redis
-        if os.getenv('VOIP_REDIS_ENABLED'):
-            self.config['redis']['enabled'] = os.getenv('VOIP_REDIS_ENABLED').lower() == 'true'
-        if os.getenv('VOIP_REDIS_HOST'):
-            self.config['redis']['host'] = os.getenv('VOIP_REDIS_HOST')
-        if os.getenv('VOIP_REDIS_PORT'):
-            self.config['redis']['port'] = int(os.getenv('VOIP_REDIS_PORT'))
-        if os.getenv('VOIP_REDIS_PASSWORD'):
-            self.config['redis']['password'] = os.getenv('VOIP_REDIS_PASSWORD')
+        get_env = os.environ.get
+        for env_name, keys, cast in _ENV_MAP:
+            value = get_env(env_name)
+            if value:
+                self.set(*keys, value=cast(value))
     
     def _merge_config(self, base, update):
         """Fusionne récursivement deux dictionnaires de configuration"""
-        for key, value in update.items():
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._merge_config(base[key], value)
-            else:
-                base[key] = value
+        if not update:
+            return
+        
+        if not base:
+            # Rien à fusionner : copie directe sans descendre dans l'arbre
+            base.update(update)
+        else:
+            for key, value in update.items():
+                base_value = base.get(key)
+                # Ne descendre que si les deux côtés sont des sections
+                if isinstance(value, dict) and isinstance(base_value, dict):
+                    self._merge_config(base_value, value)
+                else:
+                    base[key] = value
+        
+        # Fusion dans la configuration racine : l'index n'est plus à jour
+        if base is self.config:
+            self._rebuild_index()
+    
+    def _rebuild_index(self):
+        """Reconstruit l'index plat à partir de la configuration imbriquée"""
+        self._flat = {}
+        self._index(self.config, ())
+    
+    def _index(self, value, path):
+        """Indexe une valeur et, si c'est un dictionnaire, tout son sous-arbre"""
+        self._flat[path] = value
+        if isinstance(value, dict):
+            for key, sub_value in value.items():
+                self._index(sub_value, path + (key,))
     
     def get(self, *keys, default=None):
         """
         Récupère une valeur de configuration
         
+        Les sections (dict) sont retournées en copie : l'index plat ne voit
+        que les modifications faites via set().
+        
         Args:
             *keys: Chemin vers la valeur (ex: 'server', 'port')
             default: Valeur par défaut si non trouvée
@@ -139,12 +193,9 @@ class Config:
         Returns:
             La valeur ou default
         """
-        value = self.config
-        for key in keys:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return default
+        value = self._flat.get(keys, default)
+        if isinstance(value, dict):
+            return _copy_tree(value)
         return value
     
     def set(self, *keys, value):
@@ -156,21 +207,32 @@ class Config:
             value: Nouvelle valeur
         """
         config = self.config
-        for key in keys[:-1]:
+        for depth, key in enumerate(keys[:-1], 1):
             if key not in config:
                 config[key] = {}
+                self._flat[keys[:depth]] = config[key]
             config = config[key]
+        
+        # Un sous-arbre remplacé ne doit pas laisser d'entrées obsolètes
+        if isinstance(config.get(keys[-1]), dict):
+            size = len(keys)
+            for path in [p for p in self._flat if p[:size] == keys]:
+                del self._flat[path]
+        
+        # Copie : une modification ultérieure du dict passé n'affecte pas l'index
+        value = _copy_tree(value)
         config[keys[-1]] = value
+        self._index(value, keys)
     
     def to_dict(self):
-        """Retourne la configuration complète"""
-        return self.config.copy()
+        """Retourne une copie de la configuration complète"""
+        return _copy_tree(self.config)
     
     def save_to_file(self, config_file):
         """Sauvegarde la configuration dans un fichier YAML"""
         try:
             with open(config_file, 'w') as f:
-                yaml.dump(self.config, f, default_flow_style=False)
+                yaml.dump(self.config, f, Dumper=_YamlDumper, default_flow_style=False)
             print(f"✓ Configuration sauvegardée dans {config_file}")
         except Exception as e:
             print(f"✗ Erreur lors de la sauvegarde: {e}")
@@ -178,18 +240,23 @@ class Config:
 
 # Instance globale de configuration
 _global_config = None
+_global_config_lock = threading.Lock()
 
 
 def get_config(config_file=None):
     """Retourne l'instance globale de configuration"""
     global _global_config
+    # Verrou uniquement lors de la première création (double vérification)
     if _global_config is None:
-        _global_config = Config(config_file)
+        with _global_config_lock:
+            if _global_config is None:
+                _global_config = Config(config_file)
     return _global_config
 
 
 def reload_config(config_file=None):
     """Recharge la configuration"""
     global _global_config
-    _global_config = Config(config_file)
+    with _global_config_lock:
+        _global_config = Config(config_file)
     return _global_config
\ No newline at end of file
@@ -1,18 +1,69 @@
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from datetime import datetime
-import eventlet
-import eventlet.wsgi
+from flask import Flask, request
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, emit, join_room
+import logging
+import threading
+import time
+from pathlib import Path
 
-from .utils import get_local_ip, generate_qr_base64
+from .utils import get_local_ip, setup_logging
 from .config import get_config
-from .storage import get_storage
+from .storage import User, get_storage
 from .blueprints import register_blueprints
 
+# orjson est optionnel : sérialisation JSON en C, plus rapide que json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
 # Instances globales
 app = None
 socketio = None
 
+# Horodatage des messages : (minute courante, chaîne HH:MM)
+_timestamp_cache = (None, '')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Fournisseur JSON Flask basé sur orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent') is not None:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class OrjsonModule:
+    """Adaptateur orjson avec l'API dumps/loads du module json (pour SocketIO)"""
+    
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
+def current_timestamp():
+    """Heure courante au format HH:MM, formatée une seule fois par minute"""
+    global _timestamp_cache
+    
+    now = time.time()
+    minute = int(now) // 60
+    if _timestamp_cache[0] != minute:
+        _timestamp_cache = (minute, time.strftime('%H:%M', time.localtime(now)))
+    return _timestamp_cache[1]
+
 
 def create_app(config=None):
     """Factory pattern pour créer l'application Flask"""
@@ -20,6 +71,10 @@ def create_app(config=None):
     
     app = Flask(__name__)
     
+    # Sérialisation JSON rapide si orjson est installé
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    
     # Configuration par défaut
     app.config['SECRET_KEY'] = 'voip_secret_key_2024'
     
@@ -33,29 +88,74 @@ def create_app(config=None):
     return app
 
 
-def create_socketio(app, cors_allowed_origins="*", ping_timeout=60, ping_interval=25):
-    """Crée l'instance SocketIO"""
+def create_socketio(app, cors_allowed_origins="*", ping_timeout=60, ping_interval=25,
+                    async_mode=None):
+    """
+    Crée l'instance SocketIO
+    
+    Args:
+        async_mode (str): Mode asynchrone ('eventlet', 'gevent', 'threading'...),
+            détecté automatiquement par Flask-SocketIO si None
+    """
     global socketio
     
+    options = {}
+    if async_mode:
+        options['async_mode'] = async_mode
+    # Paquets SocketIO (SDP, candidats ICE...) sérialisés avec orjson si disponible
+    if orjson is not None:
+        options['json'] = OrjsonModule
+    
     socketio = SocketIO(
         app, 
         cors_allowed_origins=cors_allowed_origins,
         ping_timeout=ping_timeout,
-        ping_interval=ping_interval
+        ping_interval=ping_interval,
+        **options
     )
     
     return socketio
 
 
-def register_socketio_handlers(socketio_instance):
-    """Enregistre tous les handlers SocketIO"""
+def register_socketio_handlers(socketio_instance, config=None):
+    """
+    Enregistre tous les handlers SocketIO
+    
+    Args:
+        config (Config): Configuration des handlers (limites, fonctionnalités,
+            batch WebRTC), configuration globale si None
+    """
     
     storage = get_storage()
     
+    # Limites et fonctionnalités lues une seule fois, pas à chaque événement
+    if config is None:
+        config = get_config()
+    max_users = config.get('limits', 'max_users_per_room')
+    max_message_length = config.get('limits', 'max_message_length')
+    audio_calls_enabled = config.get('features', 'audio_calls')
+    video_calls_enabled = config.get('features', 'video_calls')
+    signal_batch_window = config.get('webrtc', 'signal_batch_window', default=0)
+    
+    # Signaux WebRTC en attente d'envoi groupé : sid destinataire -> signaux
+    pending_signals = {}
+    # Ajout et envoi ne doivent pas se croiser (async_mode 'threading')
+    pending_signals_lock = threading.Lock()
+    
+    def flush_signals(target_sid):
+        """Envoie en un seul événement les signaux accumulés pour un destinataire"""
+        socketio_instance.sleep(signal_batch_window)
+        with pending_signals_lock:
+            signals = pending_signals.pop(target_sid, None)
+        if signals:
+            socketio_instance.emit('webrtc_signal_batch', {
+                'signals': signals
+            }, room=target_sid)
+    
     @socketio_instance.on('connect')
     def handle_connect():
         """Nouvelle connexion"""
-        print(f"✓ Client connecté: {request.sid}")
+        logger.info("Client connecté: %s", request.sid)
         emit('server_message', {'msg': 'Connecté au serveur'})
 
     @socketio_instance.on('disconnect')
@@ -65,32 +165,21 @@ def register_socketio_handlers(socketio_instance):
         user = storage.get_user(sid)
         
         if user:
-            username = user['name']
-            room = user.get('room')
+            username = user.name
+            room = user.room
             
-            if room:
-                room_users = storage.get_room(room)
-                if sid in room_users:
-                    storage.remove_user_from_room(room, sid)
-                
+            # Quitter la room (supprimée si elle devient vide)
+            if room and not storage.leave_room(room, sid):
                 # Notifier les autres
-                remaining_users = [
-                    storage.get_user(s)['name'] 
-                    for s in storage.get_room(room) 
-                    if storage.get_user(s)
-                ]
+                remaining_users = storage.get_room_usernames(room)
                 
                 emit('user_left', {
                     'username': username,
                     'users': remaining_users
                 }, room=room)
-                
-                # Supprimer la room si vide
-                if not storage.get_room(room):
-                    storage.delete_room(room)
             
             storage.delete_user(sid)
-            print(f"✗ {username} déconnecté")
+            logger.info("%s déconnecté", username)
 
     @socketio_instance.on('join')
     def handle_join(data):
@@ -100,22 +189,16 @@ def register_socketio_handlers(socketio_instance):
         room = data.get('room', 'lobby')
         
         # Vérifier les limites
-        config = get_config()
-        max_users = config.get('limits', 'max_users_per_room')
-        
         if len(storage.get_room(room)) >= max_users:
             emit('error', {'msg': 'Room pleine'})
             return
         
         # Enregistrer l'utilisateur
-        storage.set_user(sid, {
-            'name': username,
-            'room': room
-        })
+        storage.set_user(sid, User(username, room))
         
         # Ajouter à la room
         join_room(room)
-        storage.add_user_to_room(room, sid)
+        storage.add_user_to_room(room, sid, username)
         
         # Notifier l'utilisateur
         emit('join_success', {
@@ -124,11 +207,7 @@ def register_socketio_handlers(socketio_instance):
         })
         
         # Notifier les autres
-        room_users = [
-            storage.get_user(s)['name'] 
-            for s in storage.get_room(room) 
-            if storage.get_user(s)
-        ]
+        room_users = storage.get_room_usernames(room)
         
         emit('user_joined', {
             'username': username,
@@ -138,30 +217,27 @@ def register_socketio_handlers(socketio_instance):
         # Envoyer la liste des utilisateurs
         emit('user_list', {'users': room_users})
         
-        print(f"✓ {username} a rejoint {room}")
+        logger.info("%s a rejoint %s", username, room)
 
     @socketio_instance.on('text_message')
     def handle_text_message(data):
         """Message texte"""
-        sid = request.sid
-        user = storage.get_user(sid)
+        message = data.get('message', '')
         
-        if not user:
+        # Vérifier la longueur avant tout accès au stockage
+        if len(message) > max_message_length:
+            emit('error', {'msg': 'Message trop long'})
             return
         
-        username = user['name']
-        room = user['room']
-        message = data.get('message', '')
-        
-        # Vérifier la longueur
-        config = get_config()
-        max_length = config.get('limits', 'max_message_length')
+        user = storage.get_user(request.sid)
         
-        if len(message) > max_length:
-            emit('error', {'msg': 'Message trop long'})
+        if not user:
             return
         
-        timestamp = datetime.now().strftime('%H:%M')
+        username = user.name
+        room = user.room
+        
+        timestamp = current_timestamp()
         
         # Broadcast à la room
         emit('text_message', {
@@ -170,7 +246,7 @@ def register_socketio_handlers(socketio_instance):
             'timestamp': timestamp
         }, room=room)
         
-        print(f"[{room}] {username}: {message}")
+        logger.debug("[%s] %s: %s", room, username, message)
 
     @socketio_instance.on('call_user')
     def handle_call(data):
@@ -181,34 +257,28 @@ def register_socketio_handlers(socketio_instance):
         if not caller:
             return
         
-        caller_name = caller['name']
+        caller_name = caller.name
         target = data.get('target')
         call_type = data.get('call_type', 'audio')
-        room = caller['room']
+        room = caller.room
         
         # Vérifier que les appels sont activés
-        config = get_config()
-        if call_type == 'audio' and not config.get('features', 'audio_calls'):
+        if call_type == 'audio' and not audio_calls_enabled:
             emit('error', {'msg': 'Appels audio désactivés'})
             return
-        if call_type == 'video' and not config.get('features', 'video_calls'):
+        if call_type == 'video' and not video_calls_enabled:
             emit('error', {'msg': 'Appels vidéo désactivés'})
             return
         
         # Trouver le destinataire
-        target_sid = None
-        for s in storage.get_room(room):
-            u = storage.get_user(s)
-            if u and u['name'] == target:
-                target_sid = s
-                break
+        target_sid = storage.find_user_sid(room, target)
         
         if target_sid:
             emit('incoming_call', {
                 'caller': caller_name,
                 'call_type': call_type
             }, room=target_sid)
-            print(f"{caller_name} appelle {target} ({call_type})")
+            logger.info("%s appelle %s (%s)", caller_name, target, call_type)
 
     @socketio_instance.on('call_answer')
     def handle_call_answer(data):
@@ -219,19 +289,14 @@ def register_socketio_handlers(socketio_instance):
         if not answerer:
             return
         
-        answerer_name = answerer['name']
+        answerer_name = answerer.name
         caller_name = data.get('caller')
         accepted = data.get('accepted', False)
         call_type = data.get('call_type', 'audio')
-        room = answerer['room']
+        room = answerer.room
         
         # Trouver l'appelant
-        caller_sid = None
-        for s in storage.get_room(room):
-            u = storage.get_user(s)
-            if u and u['name'] == caller_name:
-                caller_sid = s
-                break
+        caller_sid = storage.find_user_sid(room, caller_name)
         
         if caller_sid:
             if accepted:
@@ -239,12 +304,12 @@ def register_socketio_handlers(socketio_instance):
                     'answerer': answerer_name,
                     'call_type': call_type
                 }, room=caller_sid)
-                print(f"{answerer_name} accepte l'appel {call_type}")
+                logger.info("%s accepte l'appel %s", answerer_name, call_type)
             else:
                 emit('call_rejected', {
                     'answerer': answerer_name
                 }, room=caller_sid)
-                print(f"{answerer_name} refuse l'appel")
+                logger.info("%s refuse l'appel", answerer_name)
 
     @socketio_instance.on('webrtc_signal')
     def handle_webrtc_signal(data):
@@ -257,22 +322,33 @@ def register_socketio_handlers(socketio_instance):
         
         target = data.get('target')
         signal = data.get('signal')
-        room = sender['room']
-        sender_name = sender['name']
+        room = sender.room
+        sender_name = sender.name
         
         # Trouver le destinataire
-        target_sid = None
-        for s in storage.get_room(room):
-            u = storage.get_user(s)
-            if u and u['name'] == target:
-                target_sid = s
-                break
+        target_sid = storage.find_user_sid(room, target)
         
-        if target_sid:
-            emit('webrtc_signal', {
-                'sender': sender_name,
-                'signal': signal
-            }, room=target_sid)
+        if not target_sid:
+            return
+        
+        payload = {
+            'sender': sender_name,
+            'signal': signal
+        }
+        
+        if not signal_batch_window:
+            emit('webrtc_signal', payload, room=target_sid)
+            return
+        
+        # Regrouper les candidats ICE reçus pendant la fenêtre de batch
+        with pending_signals_lock:
+            queued = pending_signals.get(target_sid)
+            if queued is None:
+                pending_signals[target_sid] = [payload]
+            else:
+                queued.append(payload)
+        if queued is None:
+            socketio_instance.start_background_task(flush_signals, target_sid)
 
     @socketio_instance.on('hangup')
     def handle_hangup(data):
@@ -283,41 +359,40 @@ def register_socketio_handlers(socketio_instance):
         if not user:
             return
         
-        username = user['name']
+        username = user.name
         target = data.get('target')
-        room = user['room']
+        room = user.room
         
         # Notifier le destinataire
-        target_sid = None
-        for s in storage.get_room(room):
-            u = storage.get_user(s)
-            if u and u['name'] == target:
-                target_sid = s
-                break
+        target_sid = storage.find_user_sid(room, target)
         
         if target_sid:
             emit('call_ended', {
                 'username': username
             }, room=target_sid)
         
-        print(f"📴 {username} raccroche")
+        logger.info("%s raccroche", username)
 
 
 def main():
     """Point d'entrée principal"""
-    config = get_config()
+    # Même recherche que la CLI : config.yml du répertoire courant s'il existe
+    config = get_config('config.yml' if Path('config.yml').exists() else None)
+    setup_logging(config)
     
     # Créer l'app et socketio
+    async_mode = config.get('socketio', 'async_mode')
     app = create_app(config.to_dict())
     socketio = create_socketio(
         app,
         cors_allowed_origins=config.get('socketio', 'cors_allowed_origins'),
         ping_timeout=config.get('socketio', 'ping_timeout'),
-        ping_interval=config.get('socketio', 'ping_interval')
+        ping_interval=config.get('socketio', 'ping_interval'),
+        async_mode=async_mode
     )
     
     # Enregistrer les handlers
-    register_socketio_handlers(socketio)
+    register_socketio_handlers(socketio, config)
     
     # Informations de démarrage
     server_ip = get_local_ip()
@@ -338,25 +413,23 @@ def main():
     print("="*60 + "\n")
     
     # Démarrer le serveur
+    ssl_args = {}
     if ssl_enabled:
         cert_file = config.get('ssl', 'cert_file')
         key_file = config.get('ssl', 'key_file')
-        
-        context = eventlet.wrap_ssl(
-            eventlet.listen((server_ip, port)),
-            certfile=cert_file,
-            keyfile=key_file,
-            server_side=True
-        )
-        eventlet.wsgi.server(context, app)
-    else:
-        socketio.run(
-            app,
-            host=server_ip,
-            port=port,
-            debug=config.get('server', 'debug')
-        )
-
+        if async_mode == 'threading':
+            # Serveur de développement Werkzeug : pas de certfile/keyfile
+            ssl_args = {'ssl_context': (cert_file, key_file)}
+        else:
+            ssl_args = {'certfile': cert_file, 'keyfile': key_file}
+    
+    socketio.run(
+        app,
+        host=server_ip,
+        port=port,
+        debug=config.get('server', 'debug'),
+        **ssl_args
+    )
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,59 +1,98 @@
-import json
-from abc import ABC, abstractmethod
+import threading
+from collections import namedtuple
+from types import MappingProxyType
 from .config import get_config
 
+# Enregistrement d'un utilisateur connecté (plus compact qu'un dict)
+User = namedtuple('User', ('name', 'room'))
+
 # Stockage en mémoire par défaut
 _memory_users = {}
 _memory_rooms = {}
+_memory_names = {}
+_memory_room_names = {}
 
 
-class StorageBackend(ABC):
-    """Interface abstraite pour les backends de stockage"""
+class StorageBackend:
+    """
+    Interface des backends de stockage
+    
+    Classe de base simple (sans ABCMeta) : les méthodes non surchargées
+    lèvent NotImplementedError à l'appel.
+    """
     
-    @abstractmethod
     def get_users(self):
         """Récupère tous les utilisateurs"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
     def get_user(self, sid):
         """Récupère un utilisateur par SID"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
     def set_user(self, sid, user_data):
-        """Enregistre un utilisateur"""
-        pass
+        """Enregistre un utilisateur (User)"""
+        raise NotImplementedError
     
-    @abstractmethod
     def delete_user(self, sid):
         """Supprime un utilisateur"""
-        pass
+        raise NotImplementedError
+    
+    def find_user_sid(self, room_name, username):
+        """
+        Retrouve le SID d'un utilisateur par son nom dans une room
+        
+        Implémentation générique (parcours des membres de la room) ;
+        les backends peuvent la remplacer par un index.
+        """
+        for sid in self.get_room(room_name):
+            user = self.get_user(sid)
+            if user and user.name == username:
+                return sid
+        return None
     
-    @abstractmethod
     def get_rooms(self):
         """Récupère toutes les rooms"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
     def get_room(self, room_name):
         """Récupère une room"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
-    def add_user_to_room(self, room_name, sid):
-        """Ajoute un utilisateur à une room"""
-        pass
+    def get_room_usernames(self, room_name):
+        """Récupère les noms des utilisateurs d'une room"""
+        raise NotImplementedError
+    
+    def add_user_to_room(self, room_name, sid, username=None):
+        """
+        Ajoute un utilisateur à une room
+        
+        username évite de relire l'utilisateur quand l'appelant le connaît déjà.
+        """
+        raise NotImplementedError
     
-    @abstractmethod
     def remove_user_from_room(self, room_name, sid):
         """Retire un utilisateur d'une room"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
     def delete_room(self, room_name):
         """Supprime une room"""
-        pass
+        raise NotImplementedError
+    
+    def leave_room(self, room_name, sid):
+        """
+        Retire un utilisateur d'une room et supprime la room si elle est vide
+        
+        Implémentation générique ; les backends peuvent la surcharger pour
+        faire le tout en moins d'accès au stockage.
+        
+        Returns:
+            bool: True si la room est désormais vide (et supprimée)
+        """
+        self.remove_user_from_room(room_name, sid)
+        if self.get_room(room_name):
+            return False
+        self.delete_room(room_name)
+        return True
 
 
 class MemoryStorage(StorageBackend):
@@ -62,44 +101,122 @@ class MemoryStorage(StorageBackend):
     def __init__(self):
         self.users = _memory_users
         self.rooms = _memory_rooms
+        # Index inverse (room, nom) -> [sid, ...] pour la signalisation,
+        # le plus récent en dernier
+        self.names = _memory_names
+        # Noms des membres de chaque room : room -> {sid: nom}
+        self.room_names = _memory_room_names
+    
+    def _unindex_user(self, sid):
+        user = self.users.get(sid)
+        if user:
+            key = (user.room, user.name)
+            sids = self.names.get(key)
+            if sids and sid in sids:
+                sids.remove(sid)
+                if not sids:
+                    del self.names[key]
     
     def get_users(self):
-        return self.users
+        # Vue en lecture seule, sans copie
+        return MappingProxyType(self.users)
     
     def get_user(self, sid):
         return self.users.get(sid)
     
     def set_user(self, sid, user_data):
+        self._unindex_user(sid)
         self.users[sid] = user_data
+        self.names.setdefault((user_data.room, user_data.name), []).append(sid)
     
     def delete_user(self, sid):
         if sid in self.users:
+            self._unindex_user(sid)
             del self.users[sid]
     
+    def find_user_sid(self, room_name, username):
+        # Nom partagé : le dernier arrivé, puis le précédent s'il part
+        sids = self.names.get((room_name, username))
+        return sids[-1] if sids else None
+    
     def get_rooms(self):
-        return self.rooms
+        # Vue en lecture seule, sans copie
+        return MappingProxyType(self.rooms)
     
     def get_room(self, room_name):
-        return self.rooms.get(room_name, [])
+        return self.rooms.get(room_name, frozenset())
+    
+    def get_room_usernames(self, room_name):
+        return list(self.room_names.get(room_name, {}).values())
     
-    def add_user_to_room(self, room_name, sid):
-        if room_name not in self.rooms:
-            self.rooms[room_name] = []
-        if sid not in self.rooms[room_name]:
-            self.rooms[room_name].append(sid)
+    def add_user_to_room(self, room_name, sid, username=None):
+        # Un set par room : ajout, retrait et test d'appartenance en O(1)
+        self.rooms.setdefault(room_name, set()).add(sid)
+        
+        if username is None:
+            user = self.users.get(sid)
+            username = user.name if user else None
+        if username is not None:
+            self.room_names.setdefault(room_name, {})[sid] = username
     
     def remove_user_from_room(self, room_name, sid):
-        if room_name in self.rooms and sid in self.rooms[room_name]:
-            self.rooms[room_name].remove(sid)
+        if room_name in self.rooms:
+            self.rooms[room_name].discard(sid)
+        if room_name in self.room_names:
+            self.room_names[room_name].pop(sid, None)
     
     def delete_room(self, room_name):
         if room_name in self.rooms:
             del self.rooms[room_name]
+        self.room_names.pop(room_name, None)
+    
+    def leave_room(self, room_name, sid):
+        names = self.room_names.get(room_name)
+        if names is not None:
+            names.pop(sid, None)
+        
+        # Une seule recherche de la room pour le retrait et le test de vacuité
+        members = self.rooms.get(room_name)
+        if members is not None:
+            members.discard(sid)
+            if members:
+                return False
+            del self.rooms[room_name]
+        self.room_names.pop(room_name, None)
+        return True
+    
+    def clear(self):
+        """Vide le stockage en mémoire (partagé par toutes les instances)"""
+        self.users.clear()
+        self.rooms.clear()
+        self.names.clear()
+        self.room_names.clear()
 
 
 class RedisStorage(StorageBackend):
     """Stockage Redis pour sessions distribuées"""
     
+    # Index des SID et des rooms existants (évite de parcourir les clés via SCAN)
+    _USERS_KEY = "voip:users"
+    _ROOMS_KEY = "voip:rooms"
+    
+    # Préfixes des clés par utilisateur / par room
+    _USER_PREFIX = "voip:user:"
+    _ROOM_PREFIX = "voip:room:"
+    
+    # KEYS : membres de la room, noms de la room, index des rooms
+    # ARGV : sid, nom de la room
+    _LEAVE_ROOM_LUA = """
+redis.call('SREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+local count = redis.call('SCARD', KEYS[1])
+if count == 0 then
+    redis.call('UNLINK', KEYS[1], KEYS[2])
+    redis.call('SREM', KEYS[3], ARGV[2])
+end
+return count
+"""
+    
     def __init__(self, host='localhost', port=6379, db=0, password=None):
         try:
             import redis
@@ -117,56 +234,132 @@ class RedisStorage(StorageBackend):
             raise ImportError("Le package 'redis' est requis. Installez-le avec: pip install redis")
         except Exception as e:
             raise ConnectionError(f"Impossible de se connecter à Redis: {e}")
+        
+        # Départ d'une room en un seul aller-retour atomique (EVALSHA)
+        self._leave_room_script = self.redis.register_script(self._LEAVE_ROOM_LUA)
     
     def _user_key(self, sid):
-        return f"voip:user:{sid}"
+        return f"{self._USER_PREFIX}{sid}"
     
     def _room_key(self, room_name):
-        return f"voip:room:{room_name}"
+        return f"{self._ROOM_PREFIX}{room_name}"
+    
+    def _room_names_key(self, room_name):
+        return f"voip:room_names:{room_name}"
     
     def get_users(self):
-        """Note: Cette méthode est coûteuse avec Redis"""
+        sids = list(self.redis.smembers(self._USERS_KEY))
+        if not sids:
+            return {}
+        
+        # Les SID lus dans Redis sont des str : concaténation directe du préfixe
+        prefix = self._USER_PREFIX
+        pipe = self.redis.pipeline(transaction=False)
+        for sid in sids:
+            pipe.hgetall(prefix + sid)
+        
         users = {}
-        for key in self.redis.scan_iter("voip:user:*"):
-            sid = key.split(":")[-1]
-            user_data = self.redis.get(key)
+        stale = []
+        for sid, user_data in zip(sids, pipe.execute()):
             if user_data:
-                users[sid] = json.loads(user_data)
+                users[sid] = User(**user_data)
+            else:
+                stale.append(sid)
+        
+        # Sessions expirées (TTL) encore présentes dans l'index
+        if stale:
+            self.redis.srem(self._USERS_KEY, *stale)
         return users
     
     def get_user(self, sid):
-        user_data = self.redis.get(self._user_key(sid))
-        return json.loads(user_data) if user_data else None
+        # Un hash par utilisateur : champs lus directement, sans JSON
+        user_data = self.redis.hgetall(self._user_key(sid))
+        return User(**user_data) if user_data else None
     
     def set_user(self, sid, user_data):
-        self.redis.set(self._user_key(sid), json.dumps(user_data))
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(self._user_key(sid), mapping=user_data._asdict())
         # TTL de 24h pour nettoyer les sessions abandonnées
-        self.redis.expire(self._user_key(sid), 86400)
+        pipe.expire(self._user_key(sid), 86400)
+        pipe.sadd(self._USERS_KEY, sid)
+        pipe.execute()
     
     def delete_user(self, sid):
-        self.redis.delete(self._user_key(sid))
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(self._user_key(sid))
+        pipe.srem(self._USERS_KEY, sid)
+        pipe.execute()
     
     def get_rooms(self):
-        """Note: Cette méthode est coûteuse avec Redis"""
+        room_names = list(self.redis.smembers(self._ROOMS_KEY))
+        
+        prefix = self._ROOM_PREFIX
+        pipe = self.redis.pipeline(transaction=False)
+        for room_name in room_names:
+            pipe.smembers(prefix + room_name)
+        
         rooms = {}
-        for key in self.redis.scan_iter("voip:room:*"):
-            room_name = key.split(":", 2)[-1]
-            rooms[room_name] = list(self.redis.smembers(key))
+        stale = []
+        for room_name, members in zip(room_names, pipe.execute()):
+            if members:
+                rooms[room_name] = list(members)
+            else:
+                stale.append(room_name)
+        
+        # Rooms expirées (TTL) encore présentes dans l'index
+        if stale:
+            self.redis.srem(self._ROOMS_KEY, *stale)
         return rooms
     
     def get_room(self, room_name):
         return list(self.redis.smembers(self._room_key(room_name)))
     
-    def add_user_to_room(self, room_name, sid):
-        self.redis.sadd(self._room_key(room_name), sid)
+    def get_room_usernames(self, room_name):
+        return self.redis.hvals(self._room_names_key(room_name))
+    
+    def find_user_sid(self, room_name, username):
+        # Noms des membres (sid -> nom) : une seule lecture au lieu d'un GET par membre
+        for sid, name in self.redis.hgetall(self._room_names_key(room_name)).items():
+            if name == username:
+                return sid
+        return None
+    
+    def add_user_to_room(self, room_name, sid, username=None):
+        if username is None:
+            username = self.redis.hget(self._user_key(sid), 'name')
+        
+        # Écritures envoyées en un seul aller-retour
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.sadd(self._room_key(room_name), sid)
         # TTL de 24h
-        self.redis.expire(self._room_key(room_name), 86400)
+        pipe.expire(self._room_key(room_name), 86400)
+        pipe.sadd(self._ROOMS_KEY, room_name)
+        if username is not None:
+            pipe.hset(self._room_names_key(room_name), sid, username)
+            pipe.expire(self._room_names_key(room_name), 86400)
+        pipe.execute()
     
     def remove_user_from_room(self, room_name, sid):
-        self.redis.srem(self._room_key(room_name), sid)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.srem(self._room_key(room_name), sid)
+        pipe.hdel(self._room_names_key(room_name), sid)
+        pipe.execute()
     
     def delete_room(self, room_name):
-        self.redis.delete(self._room_key(room_name))
+        pipe = self.redis.pipeline(transaction=False)
+        # UNLINK libère la mémoire en arrière-plan au lieu de bloquer comme DEL
+        pipe.unlink(self._room_key(room_name), self._room_names_key(room_name))
+        pipe.srem(self._ROOMS_KEY, room_name)
+        pipe.execute()
+    
+    def leave_room(self, room_name, sid):
+        # Retrait, comptage et suppression de la room vide sans qu'un join
+        # puisse s'intercaler
+        count = self._leave_room_script(
+            keys=[self._room_key(room_name), self._room_names_key(room_name), self._ROOMS_KEY],
+            args=[sid, room_name]
+        )
+        return count == 0
     
     def get_room_count(self, room_name):
         """Nombre d'utilisateurs dans une room"""
@@ -175,35 +368,47 @@ class RedisStorage(StorageBackend):
 
 # Instance globale
 _storage = None
+_storage_lock = threading.Lock()
+
+
+def _create_storage():
+    """Crée le backend de stockage indiqué par la configuration"""
+    config = get_config()
+    
+    if config.get('redis', 'enabled'):
+        try:
+            storage = RedisStorage(
+                host=config.get('redis', 'host'),
+                port=config.get('redis', 'port'),
+                db=config.get('redis', 'db'),
+                password=config.get('redis', 'password')
+            )
+            print("✓ Utilisation du stockage Redis")
+            return storage
+        except Exception as e:
+            print(f"⚠ Erreur Redis, utilisation du stockage mémoire: {e}")
+            return MemoryStorage()
+    
+    print("✓ Utilisation du stockage mémoire")
+    return MemoryStorage()
 
 
 def get_storage():
     """Retourne l'instance de stockage appropriée"""
     global _storage
     
-    if _storage is None:
-        config = get_config()
-        
-        if config.get('redis', 'enabled'):
-            try:
-                _storage = RedisStorage(
-                    host=config.get('redis', 'host'),
-                    port=config.get('redis', 'port'),
-                    db=config.get('redis', 'db'),
-                    password=config.get('redis', 'password')
-                )
-                print("✓ Utilisation du stockage Redis")
-            except Exception as e:
-                print(f"⚠ Erreur Redis, utilisation du stockage mémoire: {e}")
-                _storage = MemoryStorage()
-        else:
-            _storage = MemoryStorage()
-            print("✓ Utilisation du stockage mémoire")
+    if _storage is not None:
+        return _storage
     
+    # Une seule connexion Redis même si plusieurs workers arrivent ensemble
+    with _storage_lock:
+        if _storage is None:
+            _storage = _create_storage()
     return _storage
 
 
 def reset_storage():
     """Réinitialise le stockage"""
     global _storage
-    _storage = None
\ No newline at end of file
+    with _storage_lock:
+        _storage = None
\ No newline at end of file
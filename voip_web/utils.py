@@ -4,12 +4,32 @@
 
 import socket
 import qrcode
+from qrcode.image.svg import SvgPathImage
 import io
 import base64
+import logging
+import queue
+import sys
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 
 
-def get_local_ip():
-    """Récupère l'IP locale de la machine"""
+# Table d'échappement HTML, construite une seule fois à l'import
+_HTML_ESCAPE_TABLE = str.maketrans({'<': '&lt;', '>': '&gt;'})
+
+# Résultats de validate_username (tuples partagés, jamais reconstruits)
+_USERNAME_OK = (True, "")
+_USERNAME_EMPTY = (False, "Le nom d'utilisateur ne peut pas être vide")
+_USERNAME_TOO_SHORT = (False, "Le nom d'utilisateur doit contenir au moins 2 caractères")
+_USERNAME_TOO_LONG = (False, "Le nom d'utilisateur ne peut pas dépasser 30 caractères")
+
+# Thread qui écrit les logs (console / fichier) hors de la boucle d'événements
+_log_listener = None
+
+
+@lru_cache(maxsize=1)
+def _detect_local_ip():
+    """Détecte l'IP locale via une socket UDP (aucun paquet n'est envoyé)"""
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
@@ -20,12 +40,36 @@ def get_local_ip():
         return socket.gethostbyname(socket.gethostname())
 
 
-def generate_qr_base64(url):
+def get_local_ip(refresh=False):
+    """
+    Récupère l'IP locale de la machine
+    
+    Le résultat est mis en cache : l'IP ne change pas pendant la durée
+    de vie du processus.
+    
+    Args:
+        refresh (bool): Force une nouvelle détection (machine multi-interfaces,
+            changement de réseau)
+        
+    Returns:
+        str: Adresse IPv4 locale
+    """
+    if refresh:
+        _detect_local_ip.cache_clear()
+    return _detect_local_ip()
+
+
+@lru_cache(maxsize=32)
+def generate_qr_base64(url, image_format='png'):
     """
     Génère un QR code en base64 pour une URL donnée
     
+    Le résultat est mis en cache par (URL, format).
+    
     Args:
         url (str): L'URL à encoder dans le QR code
+        image_format (str): 'png' (via PIL) ou 'svg' (sans image PIL ni compression
+            zlib, à afficher en data:image/svg+xml;base64)
         
     Returns:
         str: Image QR code encodée en base64
@@ -38,10 +82,13 @@ def generate_qr_base64(url):
     qr.add_data(url)
     qr.make(fit=True)
     
-    img = qr.make_image(fill_color="black", back_color="white")
     buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    if image_format == 'svg':
+        img = qr.make_image(image_factory=SvgPathImage)
+        img.save(buffer)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buffer, format='PNG')
     
     return base64.b64encode(buffer.getvalue()).decode()
 
@@ -56,16 +103,18 @@ def validate_username(username):
     Returns:
         tuple: (bool, str) - (valide, message d'erreur)
     """
-    if not username or not username.strip():
-        return False, "Le nom d'utilisateur ne peut pas être vide"
+    # isspace() évite la copie faite par strip()
+    if not username or username.isspace():
+        return _USERNAME_EMPTY
     
-    if len(username) < 2:
-        return False, "Le nom d'utilisateur doit contenir au moins 2 caractères"
+    length = len(username)
+    if length < 2:
+        return _USERNAME_TOO_SHORT
     
-    if len(username) > 30:
-        return False, "Le nom d'utilisateur ne peut pas dépasser 30 caractères"
+    if length > 30:
+        return _USERNAME_TOO_LONG
     
-    return True, ""
+    return _USERNAME_OK
 
 
 def sanitize_message(message):
@@ -81,7 +130,47 @@ def sanitize_message(message):
     if not message:
         return ""
     
-    # Enlever les balises HTML basiques
-    message = message.replace("<", "&lt;").replace(">", "&gt;")
+    # Enlever les balises HTML basiques (un seul passage sur la chaîne,
+    # après le strip pour ne pas traiter les espaces superflus)
+    return message.strip().translate(_HTML_ESCAPE_TABLE)
+
+
+def setup_logging(config):
+    """
+    Configure le logger 'voip_web' depuis la section logging de la config
+    
+    Les handlers SocketIO ne font que déposer les enregistrements dans une
+    file : l'écriture sur la console et dans le fichier est faite par un
+    thread dédié (QueueListener).
+    
+    Args:
+        config (Config): Configuration à utiliser
+        
+    Returns:
+        QueueListener: Le listener démarré
+    """
+    global _log_listener
+    
+    if _log_listener is not None:
+        _log_listener.stop()
+    
+    formatter = logging.Formatter(config.get('logging', 'format'))
+    handlers = []
+    if config.get('logging', 'console'):
+        handlers.append(logging.StreamHandler(sys.stdout))
+    log_file = config.get('logging', 'file')
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger('voip_web')
+    logger.setLevel(config.get('logging', 'level', default='INFO').upper())
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
     
-    return message.strip()
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    return _log_listener